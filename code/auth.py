@@ -1,21 +1,48 @@
 import os
+from dataclasses import dataclass
 from dotenv import load_dotenv
 
-# Load environment variables from .env file
-load_dotenv()
 
-# Reddit API credentials
-client_id = os.getenv('REDDIT_CLIENT_ID')
-client_secret = os.getenv('REDDIT_CLIENT_SECRET')
-username = os.getenv('REDDIT_USERNAME')
-password = os.getenv('REDDIT_PASSWORD')
-u_agent = os.getenv('REDDIT_USER_AGENT')
+@dataclass(frozen=True, slots=True)
+class Credentials:
+    # Reddit API credentials
+    client_id: str | None
+    client_secret: str | None
+    username: str | None
+    password: str | None
+    u_agent: str | None
+    # OpenAI API key
+    openai_key: str | None
+    # Anthropic API key
+    anthropic_key: str | None
+    # Perspective API key
+    perspective_api_key: str | None
+
 
-# OpenAI API key
-openai_key = os.getenv('OPENAI_API_KEY')
+# Environment variable for each Credentials field, in field order
+_ENV_VARS = (
+    'REDDIT_CLIENT_ID',
+    'REDDIT_CLIENT_SECRET',
+    'REDDIT_USERNAME',
+    'REDDIT_PASSWORD',
+    'REDDIT_USER_AGENT',
+    'OPENAI_API_KEY',
+    'ANTHROPIC_API_KEY',
+    'PERSPECTIVE_API_KEY',
+)
+
+# Load environment variables from .env file
+load_dotenv()
 
-# Anthropic API key
-anthropic_key = os.getenv('ANTHROPIC_API_KEY')
+# Read the credentials once into an immutable snapshot
+creds = Credentials(*(os.getenv(name) for name in _ENV_VARS))
 
-# Perspective API key
-perspective_api_key = os.getenv('PERSPECTIVE_API_KEY')
+# Module-level names used by the rest of the code
+client_id = creds.client_id
+client_secret = creds.client_secret
+username = creds.username
+password = creds.password
+u_agent = creds.u_agent
+openai_key = creds.openai_key
+anthropic_key = creds.anthropic_key
+perspective_api_key = creds.perspective_api_key
@@ -883,7 +883,7 @@ class Run:
                 role = 'user'
             else:
                 role = 'assistant'
-            messages.append({"role": role, "content": message.text})
+            messages.append(gai_interface.Msg(role, message.text))
         
         # Get max tokens from config (use default if not specified for this model)
         max_tokens = config.get('max_tokens', gai_interface.DEFAULT_MAX_TOKENS)
@@ -897,7 +897,8 @@ class Run:
             max_tokens=max_tokens,
             max_interactions=config['max_interactions'],
             goodbye_message=config['goodbye_message'],
-            conversation_length=len(conversation.messages)
+            conversation_length=len(conversation.messages),
+            max_reply_tokens=config.get('max_reply_tokens')
         )
 
     def archive_modmail(self, conversation):
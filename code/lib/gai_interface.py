@@ -6,40 +6,328 @@ This module provides a reusable interface for interacting with various AI platfo
 the main chatbot and the command-line testing utility.
 """
 
+import asyncio
+import atexit
+import hashlib
+import importlib
+import importlib.util
+import json
 import logging
-from openai import OpenAI, BadRequestError
-from anthropic import Anthropic
+import os
+import re
+import shelve
+import sys
+from collections import OrderedDict
 import auth
 
 # Default maximum token limit for conversation context
 DEFAULT_MAX_TOKENS = 7000
 
-# Initialize AI clients conditionally based on available API keys
-OpenAIClient = None
-AnthropicClient = None
+# Default maximum length of a Claude reply (the Anthropic API requires a limit)
+DEFAULT_MAX_REPLY_TOKENS = 1024
 
-if auth.openai_key:
-    try:
-        OpenAIClient = OpenAI(api_key=auth.openai_key)
-        logging.info('OpenAI client initialized successfully')
-    except Exception as e:
-        logging.warning(f'Failed to initialize OpenAI client: {e}')
+# Share of max_tokens kept for the most recent messages when a conversation is truncated
+RECENT_HISTORY_SHARE = 0.5
+
+# Prefix marking an older message that was shortened to fit the token budget
+TRUNCATION_MARKER = "…"
+
+# Default number of user turns packed into one request by get_ai_replies_packed
+DEFAULT_MAX_PROMPTS_PER_REQUEST = 10
+
+# Markdown code fence that models sometimes wrap JSON replies in
+_CODE_FENCE_RE = re.compile(r'```(?:json)?\s*(.*?)\s*```', re.DOTALL)
+
+# Replies to identical requests can be cached for prompt testing. Set GAI_CACHE=1 to
+# enable the in-memory cache, and GAI_CACHE_FILE to a path to also keep it between runs.
+# Live conversations should not set these.
+RESPONSE_CACHE_SIZE = 256
+_response_cache = OrderedDict()
+
+# AI clients are created on first use, so only the SDK for the platform being used
+# is imported. Each is None if the API key is missing or initialization failed.
+# Async clients are not kept here; see _new_async_client().
+_NOT_LOADED = object()
+OpenAIClient = _NOT_LOADED
+AnthropicClient = _NOT_LOADED
+
+# HTTP client shared by the sync OpenAI and Anthropic clients, so consecutive requests
+# reuse kept-alive connections
+_http_client = None
 
-if auth.anthropic_key:
+
+def _shared_http_client():
+    """Get the shared HTTP client, creating it on first use. Returns None if httpx is unavailable."""
+    global _http_client
+    if _http_client is None:
+        try:
+            import httpx
+        except ImportError:
+            return None
+        # HTTP/2 needs the optional h2 package
+        http2 = importlib.util.find_spec('h2') is not None
+        _http_client = httpx.Client(
+            http2=http2,
+            limits=httpx.Limits(max_keepalive_connections=16, keepalive_expiry=120),
+            timeout=httpx.Timeout(600.0, connect=10.0))
+        atexit.register(_http_client.close)
+    return _http_client
+
+
+def _load_client(module_name, class_name, api_key, share_http_client=False):
+    """Import an AI platform SDK and create a client, or return None if that fails."""
+    if not api_key:
+        return None
     try:
-        AnthropicClient = Anthropic(api_key=auth.anthropic_key)
-        logging.info('Anthropic client initialized successfully')
+        module = importlib.import_module(module_name)
+        kwargs = {'api_key': api_key}
+        if share_http_client:
+            http_client = _shared_http_client()
+            if http_client is not None:
+                kwargs['http_client'] = http_client
+        client = getattr(module, class_name)(**kwargs)
+        logging.info(f'{class_name} client initialized successfully')
+        return client
     except Exception as e:
-        logging.warning(f'Failed to initialize Anthropic client: {e}')
+        logging.warning(f'Failed to initialize {class_name} client: {e}')
+        return None
+
+
+def _openai_client():
+    """Get the OpenAI client, creating it on first use."""
+    global OpenAIClient
+    if OpenAIClient is _NOT_LOADED:
+        OpenAIClient = _load_client('openai', 'OpenAI', auth.openai_key, share_http_client=True)
+    return OpenAIClient
+
+
+def _anthropic_client():
+    """Get the Anthropic client, creating it on first use."""
+    global AnthropicClient
+    if AnthropicClient is _NOT_LOADED:
+        AnthropicClient = _load_client('anthropic', 'Anthropic', auth.anthropic_key, share_http_client=True)
+    return AnthropicClient
+
+
+def _new_async_client(gai_platform):
+    """
+    Create an async client for gai_platform, or return None if that fails.
+    
+    Async clients keep their connections tied to the event loop they were first used on,
+    so a new client is created for each event loop instead of being cached.
+    """
+    if gai_platform == 'openai':
+        return _load_client('openai', 'AsyncOpenAI', auth.openai_key)
+    if gai_platform == 'claude':
+        return _load_client('anthropic', 'AsyncAnthropic', auth.anthropic_key)
+    return None
+
+
+def _estimate_tokens(text):
+    """Estimate the number of tokens in text using the ~4 characters per token heuristic."""
+    return (len(text) + 3) // 4
+
+
+class Msg:
+    """A conversation message with its estimated token count computed once."""
+    __slots__ = ('role', 'content', 'tok')
+    
+    def __init__(self, role, content):
+        self.role = role
+        self.content = content
+        self.tok = _estimate_tokens(content)
+    
+    def __repr__(self):
+        return f"Msg({self.role!r}, {self.content!r})"
+
+
+def to_api(messages):
+    """Convert Msg objects to the message dicts expected by the AI platform APIs."""
+    return [{"role": message.role, "content": message.content} for message in messages]
+
+
+def truncate_strategic(system, messages, max_tokens):
+    """
+    Fit a conversation into max_tokens by giving each part of it its own budget.
+    
+    The system prompt is always kept whole. The most recent messages, starting from a
+    user message, are kept whole within RECENT_HISTORY_SHARE of max_tokens. Older
+    messages share the rest of the budget: each is cut to its last L tokens, where L is
+    the largest length at which they all fit, so only the longest ones are shortened.
+    Shortened messages start with TRUNCATION_MARKER.
+    Leading assistant messages are dropped, so the result always starts with a user message.
+    
+    Args:
+        system: System prompt/instructions for the bot
+        messages: List of Msg objects, oldest first
+        max_tokens: Maximum token limit for the conversation context
+        
+    Returns:
+        List of Msg objects that fits the budget, or None if the newest message alone
+        does not fit
+    """
+    available = max_tokens - _estimate_tokens(system)
+    if not messages or messages[-1].tok > available:
+        return None
+    
+    # Recent messages are kept whole (always at least the newest one)
+    recent_budget = min(available, max(int(max_tokens * RECENT_HISTORY_SHARE), messages[-1].tok))
+    split, used = len(messages), 0
+    while split > 0 and used + messages[split - 1].tok <= recent_budget:
+        split -= 1
+        used += messages[split].tok
+    
+    # Start the recent window on a user message; earlier replies join the older messages
+    while split < len(messages) - 1 and messages[split].role == 'assistant':
+        used -= messages[split].tok
+        split += 1
+    
+    # Like the recent window, don't open the conversation with half of an exchange
+    older = _fit_to_budget(messages[:split], available - used)
+    start = 0
+    while start < len(older) and older[start].role == 'assistant':
+        start += 1
+    return older[start:] + messages[split:]
+
+
+def _fit_to_budget(messages, budget):
+    """Shorten the longest messages to their last L tokens so the messages fit within budget."""
+    if sum(message.tok for message in messages) <= budget:
+        return list(messages)
+    if budget <= 0:
+        return []
+    
+    # Find the largest L with sum(min(tok, L)) <= budget
+    lengths = sorted(message.tok for message in messages)
+    remaining = budget
+    for i, length in enumerate(lengths):
+        count = len(lengths) - i
+        if length * count > remaining:
+            threshold = remaining // count
+            break
+        remaining -= length
+    
+    fitted = []
+    for message in messages:
+        if message.tok <= threshold:
+            fitted.append(message)
+        elif threshold * 4 > len(TRUNCATION_MARKER):
+            # Keep the end of the message, which leads into the rest of the conversation, and
+            # mark the cut so the model doesn't read it as a whole turn
+            kept_chars = threshold * 4 - len(TRUNCATION_MARKER)
+            fitted.append(Msg(message.role, TRUNCATION_MARKER + message.content[-kept_chars:]))
+    return fitted
+
+
+def _build_final_messages(messages, bot_instructions, max_tokens=None, max_interactions=None,
+                          goodbye_message=None, conversation_length=None, precomputed_tokens=None):
+    """
+    Apply the interaction and token limits and build the message list to send.
+    
+    Args:
+        See get_ai_reply()
+        
+    Returns:
+        Tuple (early_reply, api_messages). early_reply is a string to return without
+        calling the API, or None if the request should be sent. api_messages does not
+        include the system prompt, since OpenAI and Claude take it in different places.
+    """
+    # Use default max_tokens if not provided
+    if max_tokens is None:
+        max_tokens = DEFAULT_MAX_TOKENS
+    
+    # Check for maximum interactions if provided
+    if max_interactions and conversation_length and conversation_length >= max_interactions:
+        return goodbye_message if goodbye_message else "Thank you for the conversation.", None
+    
+    # Accept plain message dicts as well as Msg objects
+    messages = [message if isinstance(message, Msg) else Msg(message['role'], message['content'])
+                for message in messages]
+    
+    # Estimate message length in tokens
+    if precomputed_tokens is None:
+        precomputed_tokens = sum(message.tok for message in messages)
+    message_len = _estimate_tokens(bot_instructions) + precomputed_tokens
+    
+    # Check if we've exceeded max tokens
+    if message_len > max_tokens:
+        messages = truncate_strategic(bot_instructions, messages, max_tokens)
+        if messages is None:
+            return "I'm sorry, but your response is too long. Can you try something shorter?", None
+    
+    return None, to_api(messages)
+
+
+def _response_cache_key(gai_platform, gai_model, bot_instructions, api_messages, max_reply_tokens):
+    """Get the response cache key for a request, or None if the cache is disabled."""
+    if os.environ.get('GAI_CACHE') != '1':
+        return None
+    return (gai_platform, gai_model, bot_instructions, max_reply_tokens,
+            tuple((message['role'], message['content']) for message in api_messages))
+
+
+def _get_cached_reply(cache_key):
+    """Look up a cached reply in memory, then in GAI_CACHE_FILE if set. Returns None on a miss."""
+    if cache_key is None:
+        return None
+    if cache_key in _response_cache:
+        _response_cache.move_to_end(cache_key)
+        return _response_cache[cache_key]
+    
+    cache_file = os.environ.get('GAI_CACHE_FILE')
+    if cache_file:
+        with shelve.open(cache_file) as disk_cache:
+            reply = disk_cache.get(_disk_cache_key(cache_key))
+        if reply is not None:
+            _remember_reply(cache_key, reply)
+            return reply
+    return None
+
+
+def _cache_reply(cache_key, reply):
+    """Store a reply in the response cache, and in GAI_CACHE_FILE if set."""
+    if cache_key is None:
+        return
+    _remember_reply(cache_key, reply)
+    cache_file = os.environ.get('GAI_CACHE_FILE')
+    if cache_file:
+        with shelve.open(cache_file) as disk_cache:
+            disk_cache[_disk_cache_key(cache_key)] = reply
+
+
+def _remember_reply(cache_key, reply):
+    """Store a reply in the in-memory cache, evicting the least recently used entry if full."""
+    _response_cache[cache_key] = reply
+    _response_cache.move_to_end(cache_key)
+    if len(_response_cache) > RESPONSE_CACHE_SIZE:
+        _response_cache.popitem(last=False)
+
+
+def _disk_cache_key(cache_key):
+    """Hash a response cache key into a string key for the shelve file."""
+    return hashlib.blake2b(repr(cache_key).encode('utf-8')).hexdigest()
+
+
+def _handle_api_error(e, gai_platform, api_messages):
+    """Log an exception raised by an AI platform and return the reply to send instead."""
+    # Check the openai module only if it has been imported, rather than importing it here
+    openai_module = sys.modules.get('openai')
+    if openai_module is not None and isinstance(e, openai_module.BadRequestError):
+        logging.warning(f"Got a BadRequestError for {api_messages}. Error is {e}")
+        return "I can't figure out how to respond to your message. Could you try again?"
+    logging.error(f"Error calling {gai_platform} API: {e}")
+    return "I encountered an error and can't figure out how to respond to your message. Could you try again?"
 
 
 def get_ai_reply(messages, bot_instructions, gai_platform, gai_model, max_tokens=None, 
-                 max_interactions=None, goodbye_message=None, conversation_length=None):
+                 max_interactions=None, goodbye_message=None, conversation_length=None,
+                 precomputed_tokens=None, max_reply_tokens=None):
     """
     Get an AI reply from the specified platform and model.
     
     Args:
-        messages: List of message dicts with 'role' ('user' or 'assistant') and 'content' (text)
+        messages: List of Msg objects, or message dicts with 'role' ('user' or 'assistant')
+            and 'content' (text)
         bot_instructions: System prompt/instructions for the bot
         gai_platform: 'openai' or 'claude'
         gai_model: Model name (e.g., 'gpt-4', 'claude-sonnet-4-5')
@@ -47,74 +335,489 @@ def get_ai_reply(messages, bot_instructions, gai_platform, gai_model, max_tokens
         max_interactions: Maximum number of interactions (optional)
         goodbye_message: Message to return when max_interactions is reached (optional)
         conversation_length: Current conversation length for checking max_interactions (optional)
+        precomputed_tokens: Estimated token count of messages, if already tracked by the caller (optional)
+        max_reply_tokens: Maximum length of a Claude reply (defaults to DEFAULT_MAX_REPLY_TOKENS)
         
     Returns:
         String reply from the AI model, or an error message
     """
-    # Use default max_tokens if not provided
-    if max_tokens is None:
-        max_tokens = DEFAULT_MAX_TOKENS
+    return _get_ai_reply(messages, bot_instructions, gai_platform, gai_model, max_tokens,
+                         max_interactions, goodbye_message, conversation_length,
+                         precomputed_tokens, max_reply_tokens)[0]
+
+
+def _get_ai_reply(messages, bot_instructions, gai_platform, gai_model, max_tokens=None,
+                  max_interactions=None, goodbye_message=None, conversation_length=None,
+                  precomputed_tokens=None, max_reply_tokens=None):
+    """
+    Implementation of get_ai_reply().
     
-    # Check for maximum interactions if provided
-    if max_interactions and conversation_length and conversation_length >= max_interactions:
-        return goodbye_message if goodbye_message else "Thank you for the conversation."
+    Returns:
+        Tuple (reply, failed) where failed is True if reply is an error message because
+        the request could not be sent or the API call failed
+    """
+    early_reply, api_messages = _build_final_messages(
+        messages, bot_instructions, max_tokens, max_interactions, goodbye_message,
+        conversation_length, precomputed_tokens)
+    if early_reply is not None:
+        return early_reply, False
+    if max_reply_tokens is None:
+        max_reply_tokens = DEFAULT_MAX_REPLY_TOKENS
     
-    # Calculate message length
-    message_len = len(bot_instructions.split())
-    for message in messages:
-        message_len += len(message['content'].split())
+    cache_key = _response_cache_key(gai_platform, gai_model, bot_instructions, api_messages, max_reply_tokens)
+    cached_reply = _get_cached_reply(cache_key)
+    if cached_reply is not None:
+        return cached_reply, False
     
-    # Check if we've exceeded max tokens
-    if message_len > max_tokens:
-        if len(messages) == 1:
-            return "I'm sorry, but your response is too long. Can you try something shorter?"
+    try:
+        if gai_platform == 'openai':
+            client = _openai_client()
+            if client is None:
+                logging.error("OpenAI client not initialized. Check OPENAI_API_KEY in .env")
+                return "Error occurred.", True
+            response = client.chat.completions.create(
+                model=gai_model,
+                messages=[{"role": "system", "content": bot_instructions}, *api_messages])
+            reply = response.choices[0].message.content
+        
+        elif gai_platform == 'claude':
+            client = _anthropic_client()
+            if client is None:
+                logging.error("Anthropic client not initialized. Check ANTHROPIC_API_KEY in .env")
+                return "Error occurred.", True
+            response = client.messages.create(
+                model=gai_model,
+                max_tokens=max_reply_tokens,
+                system=bot_instructions,
+                messages=api_messages)
+            reply = response.content[0].text
         
-        # Recursively call with truncated messages (keep conversation_length unchanged)
-        truncated_messages = messages[1:]
-        updated_instructions = bot_instructions + " You are in the middle of a conversation with the user."
-        return get_ai_reply(truncated_messages, updated_instructions, gai_platform, gai_model, 
-                          max_tokens, max_interactions, goodbye_message, conversation_length)
+        else:
+            logging.error(f"Unknown GAI platform: {gai_platform}")
+            return "Error occurred.", True
+    
+    except Exception as e:
+        return _handle_api_error(e, gai_platform, api_messages), True
+    
+    _cache_reply(cache_key, reply)
+    return reply, False
+
+
+async def aget_ai_reply(messages, bot_instructions, gai_platform, gai_model, max_tokens=None,
+                        max_interactions=None, goodbye_message=None, conversation_length=None,
+                        precomputed_tokens=None, max_reply_tokens=None, client=None):
+    """
+    Asynchronous version of get_ai_reply() using the async OpenAI and Anthropic clients.
+    
+    Takes the same arguments and returns the same replies as get_ai_reply(), plus:
+        client: Async client for gai_platform to send the request with (optional). If not
+            given, a client is created for this call and closed afterwards.
+    """
+    early_reply, api_messages = _build_final_messages(
+        messages, bot_instructions, max_tokens, max_interactions, goodbye_message,
+        conversation_length, precomputed_tokens)
+    if early_reply is not None:
+        return early_reply
+    if max_reply_tokens is None:
+        max_reply_tokens = DEFAULT_MAX_REPLY_TOKENS
     
-    # Build final message list with system prompt
-    final_messages = [{"role": "system", "content": bot_instructions}] + messages
+    cache_key = _response_cache_key(gai_platform, gai_model, bot_instructions, api_messages, max_reply_tokens)
+    cached_reply = _get_cached_reply(cache_key)
+    if cached_reply is not None:
+        return cached_reply
+    
+    owns_client = client is None
+    if owns_client:
+        client = _new_async_client(gai_platform)
     
     try:
         if gai_platform == 'openai':
-            if OpenAIClient is None:
+            if client is None:
                 logging.error("OpenAI client not initialized. Check OPENAI_API_KEY in .env")
                 return "Error occurred."
-            response = OpenAIClient.chat.completions.create(
+            response = await client.chat.completions.create(
                 model=gai_model,
-                messages=final_messages)
+                messages=[{"role": "system", "content": bot_instructions}, *api_messages])
             reply = response.choices[0].message.content
         
         elif gai_platform == 'claude':
-            if AnthropicClient is None:
+            if client is None:
                 logging.error("Anthropic client not initialized. Check ANTHROPIC_API_KEY in .env")
                 return "Error occurred."
-            # Claude API requires separating system prompt from messages
-            claude_messages = [msg for msg in final_messages if msg['role'] != 'system']
-            response = AnthropicClient.messages.create(
+            response = await client.messages.create(
                 model=gai_model,
-                max_tokens=1024,
+                max_tokens=max_reply_tokens,
                 system=bot_instructions,
-                messages=claude_messages)
+                messages=api_messages)
             reply = response.content[0].text
         
         else:
             logging.error(f"Unknown GAI platform: {gai_platform}")
             return "Error occurred."
     
-    except BadRequestError as e:
-        logging.warning(f"Got a BadRequestError for {final_messages}. Error is {e}")
-        return "I can't figure out how to respond to your message. Could you try again?"
     except Exception as e:
-        logging.error(f"Error calling {gai_platform} API: {e}")
-        return "I encountered an error and can't figure out how to respond to your message. Could you try again?"
-            
+        return _handle_api_error(e, gai_platform, api_messages)
+    finally:
+        if owns_client and client is not None:
+            await client.close()
+    
+    _cache_reply(cache_key, reply)
     return reply
 
 
+def stream_ai_reply(messages, bot_instructions, gai_platform, gai_model, max_tokens=None,
+                    max_interactions=None, goodbye_message=None, conversation_length=None,
+                    precomputed_tokens=None, max_reply_tokens=None):
+    """
+    Streaming version of get_ai_reply() that yields the reply in pieces as they arrive.
+    
+    Takes the same arguments as get_ai_reply(). Joining the yielded strings gives the
+    full reply. Early replies and error messages are yielded as a single piece. If the
+    stream fails after part of the reply has been yielded, the error is logged and
+    re-raised, so the caller can discard the partial reply.
+    """
+    early_reply, api_messages = _build_final_messages(
+        messages, bot_instructions, max_tokens, max_interactions, goodbye_message,
+        conversation_length, precomputed_tokens)
+    if early_reply is not None:
+        yield early_reply
+        return
+    if max_reply_tokens is None:
+        max_reply_tokens = DEFAULT_MAX_REPLY_TOKENS
+    
+    cache_key = _response_cache_key(gai_platform, gai_model, bot_instructions, api_messages, max_reply_tokens)
+    cached_reply = _get_cached_reply(cache_key)
+    if cached_reply is not None:
+        yield cached_reply
+        return
+    
+    pieces = []
+    try:
+        if gai_platform == 'openai':
+            client = _openai_client()
+            if client is None:
+                logging.error("OpenAI client not initialized. Check OPENAI_API_KEY in .env")
+                yield "Error occurred."
+                return
+            stream = client.chat.completions.create(
+                model=gai_model,
+                messages=[{"role": "system", "content": bot_instructions}, *api_messages],
+                stream=True)
+            for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    pieces.append(chunk.choices[0].delta.content)
+                    yield pieces[-1]
+        
+        elif gai_platform == 'claude':
+            client = _anthropic_client()
+            if client is None:
+                logging.error("Anthropic client not initialized. Check ANTHROPIC_API_KEY in .env")
+                yield "Error occurred."
+                return
+            with client.messages.stream(
+                    model=gai_model,
+                    max_tokens=max_reply_tokens,
+                    system=bot_instructions,
+                    messages=api_messages) as stream:
+                for text in stream.text_stream:
+                    pieces.append(text)
+                    yield text
+        
+        else:
+            logging.error(f"Unknown GAI platform: {gai_platform}")
+            yield "Error occurred."
+            return
+    
+    except Exception as e:
+        if pieces:
+            logging.error(f"{gai_platform} stream failed after {len(pieces)} pieces: {e}")
+            raise
+        yield _handle_api_error(e, gai_platform, api_messages)
+        return
+    
+    _cache_reply(cache_key, ''.join(pieces))
+
+
+def get_ai_replies_parallel(requests):
+    """
+    Get AI replies for several independent requests concurrently.
+    
+    One async client per platform is shared by the requests and closed when they finish.
+    
+    Args:
+        requests: List of dicts of keyword arguments for get_ai_reply()
+        
+    Returns:
+        List of replies, in the same order as requests
+    """
+    async def gather_replies():
+        # Clients are created inside the event loop that asyncio.run starts for this call
+        clients = {platform: _new_async_client(platform)
+                   for platform in {request['gai_platform'] for request in requests}}
+        try:
+            return await asyncio.gather(*(
+                aget_ai_reply(**request, client=clients[request['gai_platform']])
+                for request in requests))
+        finally:
+            for client in clients.values():
+                if client is not None:
+                    await client.close()
+    
+    return asyncio.run(gather_replies())
+
+
+def get_ai_replies_packed(bot_instructions, user_turns, gai_platform, gai_model, history=None,
+                          max_prompts_per_request=None, max_tokens=None, max_reply_tokens=None):
+    """
+    Get replies to several independent user turns, packing several turns into each request.
+    
+    Each request asks the model to answer up to max_prompts_per_request turns at once as a
+    JSON array, so the bot instructions are only sent once per request. If a packed reply
+    cannot be parsed, the turns in that request are sent one at a time instead. If the
+    request itself fails, each turn in it gets the error message without being resent.
+    
+    Args:
+        bot_instructions: System prompt/instructions for the bot
+        user_turns: List of user messages, each answered independently
+        gai_platform: 'openai' or 'claude'
+        gai_model: Model name
+        history: List of message dicts that precede each user turn (optional)
+        max_prompts_per_request: Maximum turns per request (defaults to DEFAULT_MAX_PROMPTS_PER_REQUEST)
+        max_tokens: Maximum token limit for the conversation context (defaults to DEFAULT_MAX_TOKENS)
+        max_reply_tokens: Maximum length of each Claude reply (defaults to DEFAULT_MAX_REPLY_TOKENS).
+            Packed requests allow this many tokens per turn.
+        
+    Returns:
+        List of replies, in the same order as user_turns
+    """
+    if max_prompts_per_request is None:
+        max_prompts_per_request = DEFAULT_MAX_PROMPTS_PER_REQUEST
+    if max_reply_tokens is None:
+        max_reply_tokens = DEFAULT_MAX_REPLY_TOKENS
+    history = list(history) if history else []
+    
+    replies = []
+    for start in range(0, len(user_turns), max_prompts_per_request):
+        chunk = user_turns[start:start + max_prompts_per_request]
+        packed_instructions = (
+            f"{bot_instructions}\n\n"
+            f"The next user message is a JSON array of {len(chunk)} separate user turns. "
+            f"Reply to each one independently. Respond with only a JSON array of {len(chunk)} "
+            f"strings, one reply per user turn, in order.")
+        packed_reply, failed = _get_ai_reply(
+            messages=history + [{"role": "user", "content": json.dumps(chunk)}],
+            bot_instructions=packed_instructions,
+            gai_platform=gai_platform,
+            gai_model=gai_model,
+            max_tokens=max_tokens,
+            # Leave room for a full-length reply to every turn, so the array isn't cut off
+            max_reply_tokens=max_reply_tokens * len(chunk))
+        if failed:
+            # Resending each turn would only multiply the failing requests (e.g. when rate limited)
+            replies.extend([packed_reply] * len(chunk))
+            continue
+        
+        fence = _CODE_FENCE_RE.fullmatch(packed_reply.strip()) if packed_reply else None
+        if fence:
+            packed_reply = fence.group(1)
+        try:
+            chunk_replies = json.loads(packed_reply)
+        except (TypeError, ValueError):
+            chunk_replies = None
+        if (isinstance(chunk_replies, list) and len(chunk_replies) == len(chunk)
+                and all(isinstance(reply, str) for reply in chunk_replies)):
+            replies.extend(chunk_replies)
+            continue
+        
+        logging.warning(f"Could not parse packed reply for {len(chunk)} turns. Sending them one at a time.")
+        for turn in chunk:
+            replies.append(get_ai_reply(
+                messages=history + [{"role": "user", "content": turn}],
+                bot_instructions=bot_instructions,
+                gai_platform=gai_platform,
+                gai_model=gai_model,
+                max_tokens=max_tokens,
+                max_reply_tokens=max_reply_tokens))
+    
+    return replies
+
+
+def submit_batch(requests, gai_platform, gai_model, max_tokens=None, max_reply_tokens=None):
+    """
+    Submit requests to the platform's Batch API for asynchronous, lower-cost processing.
+    
+    Args:
+        requests: List of dicts with 'custom_id', 'messages', and 'bot_instructions' keys.
+            custom_id must be unique within the batch and may only contain letters,
+            digits, '_' and '-'.
+        gai_platform: 'openai' or 'claude'
+        gai_model: Model name
+        max_tokens: Maximum token limit for each conversation context (defaults to DEFAULT_MAX_TOKENS)
+        max_reply_tokens: Maximum length of each Claude reply (defaults to DEFAULT_MAX_REPLY_TOKENS)
+        
+    Returns:
+        Batch ID, or None if the batch could not be submitted
+    """
+    if max_reply_tokens is None:
+        max_reply_tokens = DEFAULT_MAX_REPLY_TOKENS
+    
+    batch_requests = []
+    for request in requests:
+        early_reply, api_messages = _build_final_messages(
+            request['messages'], request['bot_instructions'], max_tokens)
+        if early_reply is not None:
+            logging.warning(f"Skipping batch request {request['custom_id']}: {early_reply}")
+            continue
+        batch_requests.append((request['custom_id'], api_messages, request['bot_instructions']))
+    
+    try:
+        if gai_platform == 'openai':
+            client = _openai_client()
+            if client is None:
+                logging.error("OpenAI client not initialized. Check OPENAI_API_KEY in .env")
+                return None
+            lines = [json.dumps({
+                "custom_id": custom_id,
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": {"model": gai_model, "messages": [
+                    {"role": "system", "content": bot_instructions}, *api_messages]}})
+                for custom_id, api_messages, bot_instructions in batch_requests]
+            batch_file = client.files.create(
+                file=("batch.jsonl", "\n".join(lines).encode('utf-8')),
+                purpose='batch')
+            batch = client.batches.create(
+                input_file_id=batch_file.id,
+                endpoint='/v1/chat/completions',
+                completion_window='24h')
+        
+        elif gai_platform == 'claude':
+            client = _anthropic_client()
+            if client is None:
+                logging.error("Anthropic client not initialized. Check ANTHROPIC_API_KEY in .env")
+                return None
+            batch = client.messages.batches.create(requests=[
+                {"custom_id": custom_id,
+                 "params": {
+                     "model": gai_model,
+                     "max_tokens": max_reply_tokens,
+                     "system": bot_instructions,
+                     "messages": api_messages}}
+                for custom_id, api_messages, bot_instructions in batch_requests])
+        
+        else:
+            logging.error(f"Unknown GAI platform: {gai_platform}")
+            return None
+    
+    except Exception as e:
+        logging.error(f"Error submitting batch to {gai_platform} API: {e}")
+        return None
+    
+    logging.info(f"Submitted batch {batch.id} with {len(batch_requests)} requests")
+    return batch.id
+
+
+def poll_batch(batch_id, gai_platform):
+    """
+    Check the status of a submitted batch.
+    
+    Args:
+        batch_id: ID returned by submit_batch()
+        gai_platform: 'openai' or 'claude'
+        
+    Returns:
+        Tuple (finished, status) where status is the platform's status string, or
+        (False, None) if the status could not be retrieved
+    """
+    try:
+        if gai_platform == 'openai':
+            client = _openai_client()
+            if client is None:
+                logging.error("OpenAI client not initialized. Check OPENAI_API_KEY in .env")
+                return False, None
+            status = client.batches.retrieve(batch_id).status
+            return status in ('completed', 'failed', 'expired', 'cancelled'), status
+        
+        elif gai_platform == 'claude':
+            client = _anthropic_client()
+            if client is None:
+                logging.error("Anthropic client not initialized. Check ANTHROPIC_API_KEY in .env")
+                return False, None
+            status = client.messages.batches.retrieve(batch_id).processing_status
+            return status == 'ended', status
+        
+        else:
+            logging.error(f"Unknown GAI platform: {gai_platform}")
+            return False, None
+    
+    except Exception as e:
+        logging.error(f"Error checking batch {batch_id} with {gai_platform} API: {e}")
+        return False, None
+
+
+def fetch_batch_results(batch_id, gai_platform):
+    """
+    Fetch the replies from a finished batch.
+    
+    Args:
+        batch_id: ID returned by submit_batch()
+        gai_platform: 'openai' or 'claude'
+        
+    Returns:
+        Dictionary mapping each custom_id to its reply, or to an error message
+        if that request failed. Empty if the results could not be fetched.
+    """
+    results = {}
+    try:
+        if gai_platform == 'openai':
+            client = _openai_client()
+            if client is None:
+                logging.error("OpenAI client not initialized. Check OPENAI_API_KEY in .env")
+                return {}
+            batch = client.batches.retrieve(batch_id)
+            if batch.status == 'failed':
+                logging.error(f"Batch {batch_id} failed: {batch.errors}")
+                return {}
+            if batch.status != 'completed':
+                # Expired and cancelled batches still have replies for the requests that finished
+                logging.warning(f"Batch {batch_id} ended with status {batch.status}; some requests have no reply")
+            for file_id in (batch.output_file_id, batch.error_file_id):
+                if not file_id:
+                    continue
+                for line in client.files.content(file_id).text.splitlines():
+                    if not line.strip():
+                        continue
+                    entry = json.loads(line)
+                    response = entry.get('response')
+                    if response and response.get('status_code') == 200:
+                        results[entry['custom_id']] = response['body']['choices'][0]['message']['content']
+                    else:
+                        logging.warning(f"Batch request {entry['custom_id']} failed: {entry.get('error') or response}")
+                        results[entry['custom_id']] = "Error occurred."
+        
+        elif gai_platform == 'claude':
+            client = _anthropic_client()
+            if client is None:
+                logging.error("Anthropic client not initialized. Check ANTHROPIC_API_KEY in .env")
+                return {}
+            for entry in client.messages.batches.results(batch_id):
+                if entry.result.type == 'succeeded':
+                    results[entry.custom_id] = entry.result.message.content[0].text
+                else:
+                    logging.warning(f"Batch request {entry.custom_id} did not succeed: {entry.result.type}")
+                    results[entry.custom_id] = "Error occurred."
+        
+        else:
+            logging.error(f"Unknown GAI platform: {gai_platform}")
+            return {}
+    
+    except Exception as e:
+        logging.error(f"Error fetching results of batch {batch_id} from {gai_platform} API: {e}")
+        return {}
+    
+    return results
+
+
 def list_available_models(config):
     """
     Get a list of all available GAI models from the config.
@@ -5,14 +5,24 @@ Unit tests for the gai_interface module.
 Tests cover:
 - list_available_models() function
 - get_ai_reply() function with various scenarios
-- Token limit handling
+- Token estimation and limit handling
 - Max interactions handling
 - Error handling
 - Platform-specific logic
+- Lazy client creation
+- Response caching
+- Asynchronous, parallel, and streaming requests
+- Batch API submission and results
+- Packing several user turns into one request
 """
 
+import asyncio
+import json
+import subprocess
+import tempfile
 import unittest
-from unittest.mock import Mock, patch, MagicMock
+from collections import OrderedDict
+from unittest.mock import Mock, patch, MagicMock, AsyncMock
 import sys
 import os
 
@@ -72,6 +82,51 @@ class TestListAvailableModels(unittest.TestCase):
         self.assertEqual(models[0], ('openai', 'gpt-4'))
 
 
+class TestLazyClients(unittest.TestCase):
+    """Tests for creating AI clients on first use."""
+    
+    def test_import_does_not_load_sdks(self):
+        """Test that importing gai_interface does not import the OpenAI or Anthropic SDKs."""
+        lib_dir = os.path.dirname(os.path.abspath(gai_interface.__file__))
+        code = ("import sys; import gai_interface; "
+                "print('openai' in sys.modules, 'anthropic' in sys.modules)")
+        result = subprocess.run(
+            [sys.executable, '-c', code],
+            cwd=lib_dir,
+            env={**os.environ, 'PYTHONPATH': os.pathsep.join([lib_dir, os.path.dirname(lib_dir)])},
+            capture_output=True, text=True, check=True)
+        
+        self.assertEqual(result.stdout.split(), ['False', 'False'])
+    
+    def test_client_none_without_api_key(self):
+        """Test that no client is created when the API key is missing."""
+        with patch.object(gai_interface, 'OpenAIClient', gai_interface._NOT_LOADED), \
+                patch.object(gai_interface.auth, 'openai_key', None):
+            self.assertIsNone(gai_interface._openai_client())
+            self.assertIsNone(gai_interface.OpenAIClient)
+    
+    def test_sync_clients_share_http_client(self):
+        """Test that sync clients are given the shared HTTP client and async clients are not."""
+        shared = Mock()
+        mock_module = Mock()
+        with patch.object(gai_interface.importlib, 'import_module', return_value=mock_module), \
+                patch.object(gai_interface, '_shared_http_client', return_value=shared):
+            gai_interface._load_client('openai', 'OpenAI', 'key', share_http_client=True)
+            mock_module.OpenAI.assert_called_once_with(api_key='key', http_client=shared)
+            
+            gai_interface._load_client('openai', 'AsyncOpenAI', 'key')
+            mock_module.AsyncOpenAI.assert_called_once_with(api_key='key')
+    
+    def test_client_created_once(self):
+        """Test that the client is created on first use and then reused."""
+        with patch.object(gai_interface, 'AnthropicClient', gai_interface._NOT_LOADED), \
+                patch.object(gai_interface, '_load_client', return_value=Mock()) as mock_load:
+            client = gai_interface._anthropic_client()
+            
+            self.assertIs(gai_interface._anthropic_client(), client)
+            mock_load.assert_called_once()
+
+
 class TestGetAiReplyMaxInteractions(unittest.TestCase):
     """Tests for max_interactions handling in get_ai_reply."""
     
@@ -188,6 +243,71 @@ class TestGetAiReplyTokenLimits(unittest.TestCase):
             # Should be called once (no recursion for these short messages)
             self.assertEqual(call_count[0], 1)
     
+    def test_token_limit_keeps_newest_messages(self):
+        """Test that recent messages are kept whole and older ones are shortened."""
+        messages = [
+            {"role": "user", "content": "a" * 400},
+            {"role": "assistant", "content": "b" * 400},
+            {"role": "user", "content": "c" * 400},
+            {"role": "assistant", "content": "d" * 40},
+            {"role": "user", "content": "e" * 40}
+        ]
+        bot_instructions = "You are a helpful assistant."
+        
+        with patch.object(gai_interface, 'OpenAIClient') as mock_client:
+            mock_response = Mock()
+            mock_response.choices = [Mock()]
+            mock_response.choices[0].message.content = "Truncated response"
+            mock_client.chat.completions.create.return_value = mock_response
+            
+            result = gai_interface.get_ai_reply(
+                messages=messages,
+                bot_instructions=bot_instructions,
+                gai_platform='openai',
+                gai_model='gpt-4',
+                max_tokens=150
+            )
+            
+            self.assertEqual(result, "Truncated response")
+            mock_client.chat.completions.create.assert_called_once()
+            passed_messages = mock_client.chat.completions.create.call_args[1]['messages']
+            # System prompt is unchanged and the newest messages are whole
+            self.assertEqual(passed_messages[0]['content'], bot_instructions)
+            self.assertEqual([m['content'] for m in passed_messages[-2:]], ["d" * 40, "e" * 40])
+            # The three long older messages are cut to the same length and marked
+            self.assertEqual([m['content'] for m in passed_messages[1:4]],
+                             ["…" + "a" * 163, "…" + "b" * 163, "…" + "c" * 163])
+    
+    def test_token_limit_window_starts_with_user(self):
+        """Test that the truncated conversation starts with a user message."""
+        messages = [
+            {"role": "assistant", "content": "a" * 800},
+            {"role": "user", "content": "b" * 400},
+            {"role": "assistant", "content": "c" * 400},
+            {"role": "user", "content": "d" * 40}
+        ]
+        bot_instructions = "You are a helpful assistant."
+        
+        with patch.object(gai_interface, 'AnthropicClient') as mock_client:
+            mock_response = Mock()
+            mock_response.content = [Mock()]
+            mock_response.content[0].text = "Truncated response"
+            mock_client.messages.create.return_value = mock_response
+            
+            gai_interface.get_ai_reply(
+                messages=messages,
+                bot_instructions=bot_instructions,
+                gai_platform='claude',
+                gai_model='claude-sonnet-4-5',
+                max_tokens=150
+            )
+            
+            call_args = mock_client.messages.create.call_args[1]
+            # The shortened leading assistant message is dropped
+            self.assertEqual([m['role'] for m in call_args['messages']], ['user', 'assistant', 'user'])
+            self.assertEqual([m['content'] for m in call_args['messages']], ["…" + "b" * 175, "…" + "c" * 175, "d" * 40])
+            self.assertEqual(call_args['system'], bot_instructions)
+    
     def test_default_max_tokens(self):
         """Test that DEFAULT_MAX_TOKENS is used when max_tokens is None."""
         messages = [{"role": "user", "content": "Hello"}]
@@ -210,6 +330,120 @@ class TestGetAiReplyTokenLimits(unittest.TestCase):
             self.assertEqual(result, "Hi!")
 
 
+class TestEstimateTokens(unittest.TestCase):
+    """Tests for the _estimate_tokens helper and precomputed token counts."""
+    
+    def test_estimate_tokens_rounds_up(self):
+        """Test that partial tokens are rounded up."""
+        self.assertEqual(gai_interface._estimate_tokens(""), 0)
+        self.assertEqual(gai_interface._estimate_tokens("a"), 1)
+        self.assertEqual(gai_interface._estimate_tokens("abcd"), 1)
+        self.assertEqual(gai_interface._estimate_tokens("abcde"), 2)
+    
+    def test_precomputed_tokens_used_for_budget(self):
+        """Test that precomputed_tokens is used instead of rescanning messages."""
+        messages = [{"role": "user", "content": "a" * 4000}]
+        bot_instructions = "You are a helpful assistant."
+        
+        with patch.object(gai_interface, 'OpenAIClient') as mock_client:
+            mock_response = Mock()
+            mock_response.choices = [Mock()]
+            mock_response.choices[0].message.content = "Hi!"
+            mock_client.chat.completions.create.return_value = mock_response
+            
+            result = gai_interface.get_ai_reply(
+                messages=messages,
+                bot_instructions=bot_instructions,
+                gai_platform='openai',
+                gai_model='gpt-4',
+                max_tokens=100,
+                precomputed_tokens=10
+            )
+            
+            self.assertEqual(result, "Hi!")
+
+
+class TestMsg(unittest.TestCase):
+    """Tests for the Msg class and to_api."""
+    
+    def test_msg_token_estimate(self):
+        """Test that Msg stores its token estimate."""
+        message = gai_interface.Msg("user", "abcde")
+        self.assertEqual(message.tok, 2)
+        with self.assertRaises(AttributeError):
+            message.extra = "not allowed"
+    
+    def test_to_api(self):
+        """Test that Msg objects are converted to API message dicts."""
+        messages = [gai_interface.Msg("assistant", "Hi!"), gai_interface.Msg("user", "Hello")]
+        self.assertEqual(gai_interface.to_api(messages), [
+            {"role": "assistant", "content": "Hi!"},
+            {"role": "user", "content": "Hello"}
+        ])
+    
+    def test_get_ai_reply_with_msg_objects(self):
+        """Test that get_ai_reply sends Msg objects as plain dicts."""
+        messages = [gai_interface.Msg("assistant", "Hi!"), {"role": "user", "content": "Hello"}]
+        
+        with patch.object(gai_interface, 'OpenAIClient') as mock_client:
+            mock_response = Mock()
+            mock_response.choices = [Mock()]
+            mock_response.choices[0].message.content = "Response"
+            mock_client.chat.completions.create.return_value = mock_response
+            
+            result = gai_interface.get_ai_reply(
+                messages, "You are a helpful assistant.", 'openai', 'gpt-4')
+            
+            self.assertEqual(result, "Response")
+            passed_messages = mock_client.chat.completions.create.call_args[1]['messages']
+            self.assertEqual(passed_messages[1:], [
+                {"role": "assistant", "content": "Hi!"},
+                {"role": "user", "content": "Hello"}
+            ])
+
+
+class TestTruncateStrategic(unittest.TestCase):
+    """Tests for truncate_strategic."""
+    
+    def test_fits_without_changes(self):
+        """Test that a conversation within budget is returned unchanged."""
+        messages = [gai_interface.Msg("user", "Hello"), gai_interface.Msg("assistant", "Hi!")]
+        self.assertEqual(gai_interface.truncate_strategic("System", messages, 100), messages)
+    
+    def test_newest_message_too_long(self):
+        """Test that None is returned when the newest message alone does not fit."""
+        messages = [gai_interface.Msg("user", "a" * 400)]
+        self.assertIsNone(gai_interface.truncate_strategic("System", messages, 50))
+    
+    def test_only_longest_older_messages_shortened(self):
+        """Test that short older messages are kept whole while long ones share the rest."""
+        messages = [
+            gai_interface.Msg("user", "a" * 40),
+            gai_interface.Msg("assistant", "b" * 800),
+            gai_interface.Msg("user", "c" * 400),
+            gai_interface.Msg("assistant", "d" * 40),
+            gai_interface.Msg("user", "e" * 40)
+        ]
+        # 100 tokens of system prompt, 20 of recent messages, leaving 80 for older messages
+        fitted = gai_interface.truncate_strategic("s" * 400, messages, 200)
+        
+        self.assertEqual([m.content for m in fitted], ["a" * 40, "…" + "b" * 139, "…" + "c" * 139, "d" * 40, "e" * 40])
+        self.assertLessEqual(sum(m.tok for m in fitted), 100)
+        # The caller's messages are not modified
+        self.assertEqual(messages[1].content, "b" * 800)
+    
+    def test_older_messages_dropped_when_no_budget(self):
+        """Test that older messages are dropped when recent messages use the whole budget."""
+        messages = [
+            gai_interface.Msg("user", "a" * 400),
+            gai_interface.Msg("assistant", "b" * 40),
+            gai_interface.Msg("user", "c" * 400)
+        ]
+        fitted = gai_interface.truncate_strategic("", messages, 100)
+        
+        self.assertEqual([m.content for m in fitted], ["c" * 400])
+
+
 class TestGetAiReplyOpenAI(unittest.TestCase):
     """Tests for OpenAI platform-specific logic."""
     
@@ -372,6 +606,458 @@ class TestGetAiReplyClaude(unittest.TestCase):
             # Verify no system role in messages
             for msg in passed_messages:
                 self.assertNotEqual(msg['role'], 'system')
+    
+    def test_claude_max_reply_tokens(self):
+        """Test that max_reply_tokens sets the Claude reply limit."""
+        messages = [{"role": "user", "content": "Hello"}]
+        
+        with patch.object(gai_interface, 'AnthropicClient') as mock_client:
+            mock_response = Mock()
+            mock_response.content = [Mock()]
+            mock_response.content[0].text = "Hi!"
+            mock_client.messages.create.return_value = mock_response
+            
+            gai_interface.get_ai_reply(
+                messages, "You are a helpful assistant.", 'claude', 'claude-sonnet-4-5')
+            self.assertEqual(mock_client.messages.create.call_args[1]['max_tokens'],
+                             gai_interface.DEFAULT_MAX_REPLY_TOKENS)
+            
+            gai_interface.get_ai_reply(
+                messages, "You are a helpful assistant.", 'claude', 'claude-sonnet-4-5',
+                max_reply_tokens=4096)
+            self.assertEqual(mock_client.messages.create.call_args[1]['max_tokens'], 4096)
+
+
+class TestGetAiRepliesParallel(unittest.TestCase):
+    """Tests for aget_ai_reply and get_ai_replies_parallel."""
+    
+    def test_parallel_replies_in_request_order(self):
+        """Test that replies are returned in the same order as the requests."""
+        def mock_create(**kwargs):
+            mock_response = Mock()
+            mock_response.choices = [Mock()]
+            mock_response.choices[0].message.content = f"Reply to {kwargs['messages'][-1]['content']}"
+            return mock_response
+        
+        requests = [
+            {"messages": [{"role": "user", "content": "first"}],
+             "bot_instructions": "You are a helpful assistant.",
+             "gai_platform": "openai", "gai_model": "gpt-4"},
+            {"messages": [{"role": "user", "content": "second"}],
+             "bot_instructions": "You are a helpful assistant.",
+             "gai_platform": "openai", "gai_model": "gpt-4",
+             "max_interactions": 1, "goodbye_message": "Goodbye!", "conversation_length": 1},
+            {"messages": [{"role": "user", "content": "third"}],
+             "bot_instructions": "You are a helpful assistant.",
+             "gai_platform": "openai", "gai_model": "gpt-4"},
+        ]
+        
+        mock_client = Mock()
+        mock_client.chat.completions.create = AsyncMock(side_effect=mock_create)
+        mock_client.close = AsyncMock()
+        
+        with patch.object(gai_interface, '_new_async_client', return_value=mock_client):
+            results = gai_interface.get_ai_replies_parallel(requests)
+            
+            self.assertEqual(results, ["Reply to first", "Goodbye!", "Reply to third"])
+            self.assertEqual(mock_client.chat.completions.create.call_count, 2)
+            mock_client.close.assert_awaited_once()
+    
+    def test_new_clients_for_each_call(self):
+        """Test that each call uses new async clients, since they can't be reused across event loops."""
+        requests = [
+            {"messages": [{"role": "user", "content": "Hello"}],
+             "bot_instructions": "You are a helpful assistant.",
+             "gai_platform": "openai", "gai_model": "gpt-4"},
+        ]
+        clients = []
+        
+        def new_client(gai_platform):
+            loop = asyncio.get_running_loop()
+            
+            async def mock_create(**kwargs):
+                # Fail like a client whose connections belong to a closed event loop
+                if asyncio.get_running_loop() is not loop:
+                    raise RuntimeError("Event loop is closed")
+                mock_response = Mock()
+                mock_response.choices = [Mock()]
+                mock_response.choices[0].message.content = "ok"
+                return mock_response
+            
+            mock_client = Mock()
+            mock_client.chat.completions.create = mock_create
+            mock_client.close = AsyncMock()
+            clients.append(mock_client)
+            return mock_client
+        
+        with patch.object(gai_interface, '_new_async_client', side_effect=new_client):
+            self.assertEqual(gai_interface.get_ai_replies_parallel(requests), ["ok"])
+            self.assertEqual(gai_interface.get_ai_replies_parallel(requests), ["ok"])
+        
+        self.assertEqual(len(clients), 2)
+        for mock_client in clients:
+            mock_client.close.assert_awaited_once()
+    
+    def test_async_claude_error_handling(self):
+        """Test that errors from the async Anthropic client are handled like sync errors."""
+        requests = [
+            {"messages": [{"role": "user", "content": "Hello"}],
+             "bot_instructions": "You are a helpful assistant.",
+             "gai_platform": "claude", "gai_model": "claude-sonnet-4-5"},
+        ]
+        
+        mock_client = Mock()
+        mock_client.messages.create = AsyncMock(side_effect=Exception("Network error"))
+        mock_client.close = AsyncMock()
+        
+        with patch.object(gai_interface, '_new_async_client', return_value=mock_client):
+            results = gai_interface.get_ai_replies_parallel(requests)
+            
+            self.assertEqual(results, ["I encountered an error and can't figure out how to respond to your message. Could you try again?"])
+
+
+class TestStreamAiReply(unittest.TestCase):
+    """Tests for stream_ai_reply."""
+    
+    def test_openai_stream(self):
+        """Test that OpenAI stream chunks are yielded in order, skipping empty deltas."""
+        chunks = []
+        for content in ["Hello", None, " there", "!"]:
+            chunk = Mock()
+            chunk.choices = [Mock()]
+            chunk.choices[0].delta.content = content
+            chunks.append(chunk)
+        messages = [{"role": "user", "content": "Hello"}]
+        
+        with patch.object(gai_interface, 'OpenAIClient') as mock_client:
+            mock_client.chat.completions.create.return_value = iter(chunks)
+            
+            parts = list(gai_interface.stream_ai_reply(
+                messages, "You are a helpful assistant.", 'openai', 'gpt-4'))
+            
+            self.assertEqual(parts, ["Hello", " there", "!"])
+            self.assertTrue(mock_client.chat.completions.create.call_args[1]['stream'])
+    
+    def test_claude_stream(self):
+        """Test that Claude text_stream pieces are yielded."""
+        messages = [{"role": "user", "content": "Hello"}]
+        
+        with patch.object(gai_interface, 'AnthropicClient') as mock_client:
+            mock_stream = MagicMock()
+            mock_stream.__enter__.return_value.text_stream = iter(["Hi", " there"])
+            mock_client.messages.stream.return_value = mock_stream
+            
+            parts = list(gai_interface.stream_ai_reply(
+                messages, "You are a helpful assistant.", 'claude', 'claude-sonnet-4-5'))
+            
+            self.assertEqual(parts, ["Hi", " there"])
+            self.assertEqual(mock_client.messages.stream.call_args[1]['system'], "You are a helpful assistant.")
+    
+    def test_stream_early_reply(self):
+        """Test that the goodbye message is yielded without calling the API."""
+        messages = [{"role": "user", "content": "Hello"}]
+        
+        with patch.object(gai_interface, 'OpenAIClient') as mock_client:
+            parts = list(gai_interface.stream_ai_reply(
+                messages, "You are a helpful assistant.", 'openai', 'gpt-4',
+                max_interactions=2, goodbye_message="Goodbye!", conversation_length=2))
+            
+            self.assertEqual(parts, ["Goodbye!"])
+            mock_client.chat.completions.create.assert_not_called()
+    
+    def test_stream_error(self):
+        """Test that API errors are yielded as the usual error message."""
+        messages = [{"role": "user", "content": "Hello"}]
+        
+        with patch.object(gai_interface, 'OpenAIClient') as mock_client:
+            mock_client.chat.completions.create.side_effect = Exception("Network error")
+            
+            parts = list(gai_interface.stream_ai_reply(
+                messages, "You are a helpful assistant.", 'openai', 'gpt-4'))
+            
+            self.assertEqual(parts, ["I encountered an error and can't figure out how to respond to your message. Could you try again?"])
+    
+    def test_stream_error_after_partial_reply(self):
+        """Test that an error after part of the reply is re-raised instead of appended to it."""
+        def failing_stream():
+            yield "Partial answer"
+            raise Exception("Connection reset")
+        messages = [{"role": "user", "content": "Hello"}]
+        
+        with patch.object(gai_interface, 'AnthropicClient') as mock_client:
+            mock_stream = MagicMock()
+            mock_stream.__enter__.return_value.text_stream = failing_stream()
+            mock_client.messages.stream.return_value = mock_stream
+            
+            parts = []
+            with self.assertRaises(Exception):
+                for text in gai_interface.stream_ai_reply(
+                        messages, "You are a helpful assistant.", 'claude', 'claude-sonnet-4-5'):
+                    parts.append(text)
+            
+            self.assertEqual(parts, ["Partial answer"])
+
+
+class TestBatch(unittest.TestCase):
+    """Tests for submit_batch, poll_batch, and fetch_batch_results."""
+    
+    def setUp(self):
+        self.requests = [
+            {"custom_id": "prompt_1--first_1--1",
+             "bot_instructions": "You are a helpful assistant.",
+             "messages": [{"role": "user", "content": "Hello"}]},
+            {"custom_id": "prompt_1--first_1--2",
+             "bot_instructions": "You are a helpful assistant.",
+             "messages": [{"role": "user", "content": "How are you?"}]},
+        ]
+    
+    def test_submit_openai_batch(self):
+        """Test that an OpenAI batch is uploaded as JSONL and created."""
+        with patch.object(gai_interface, 'OpenAIClient') as mock_client:
+            mock_client.files.create.return_value = Mock(id='file-123')
+            mock_client.batches.create.return_value = Mock(id='batch_123')
+            
+            batch_id = gai_interface.submit_batch(self.requests, 'openai', 'gpt-4')
+            
+            self.assertEqual(batch_id, 'batch_123')
+            _, content = mock_client.files.create.call_args[1]['file']
+            lines = [json.loads(line) for line in content.decode('utf-8').splitlines()]
+            self.assertEqual([line['custom_id'] for line in lines],
+                             ["prompt_1--first_1--1", "prompt_1--first_1--2"])
+            self.assertEqual(lines[0]['url'], '/v1/chat/completions')
+            self.assertEqual(lines[0]['body']['model'], 'gpt-4')
+            self.assertEqual(lines[0]['body']['messages'][0]['role'], 'system')
+            self.assertEqual(mock_client.batches.create.call_args[1]['input_file_id'], 'file-123')
+    
+    def test_submit_claude_batch(self):
+        """Test that Claude batch requests keep the system prompt separate."""
+        with patch.object(gai_interface, 'AnthropicClient') as mock_client:
+            mock_client.messages.batches.create.return_value = Mock(id='msgbatch_123')
+            
+            batch_id = gai_interface.submit_batch(self.requests, 'claude', 'claude-sonnet-4-5')
+            
+            self.assertEqual(batch_id, 'msgbatch_123')
+            batch_requests = mock_client.messages.batches.create.call_args[1]['requests']
+            self.assertEqual(len(batch_requests), 2)
+            params = batch_requests[0]['params']
+            self.assertEqual(params['system'], "You are a helpful assistant.")
+            self.assertEqual(params['messages'], [{"role": "user", "content": "Hello"}])
+    
+    def test_submit_batch_client_not_initialized(self):
+        """Test that None is returned when the client is not initialized."""
+        with patch.object(gai_interface, 'OpenAIClient', None):
+            self.assertIsNone(gai_interface.submit_batch(self.requests, 'openai', 'gpt-4'))
+    
+    def test_poll_claude_batch(self):
+        """Test that a Claude batch is finished once processing has ended."""
+        with patch.object(gai_interface, 'AnthropicClient') as mock_client:
+            mock_client.messages.batches.retrieve.return_value = Mock(processing_status='in_progress')
+            self.assertEqual(gai_interface.poll_batch('msgbatch_123', 'claude'), (False, 'in_progress'))
+            
+            mock_client.messages.batches.retrieve.return_value = Mock(processing_status='ended')
+            self.assertEqual(gai_interface.poll_batch('msgbatch_123', 'claude'), (True, 'ended'))
+    
+    def test_fetch_openai_batch_results(self):
+        """Test that OpenAI batch output is parsed into replies by custom_id."""
+        output = "\n".join([
+            json.dumps({"custom_id": "a", "response": {"status_code": 200, "body": {
+                "choices": [{"message": {"content": "Reply A"}}]}}}),
+            json.dumps({"custom_id": "b", "response": {"status_code": 400, "body": {}},
+                        "error": None}),
+        ])
+        with patch.object(gai_interface, 'OpenAIClient') as mock_client:
+            mock_client.batches.retrieve.return_value = Mock(
+                status='completed', output_file_id='file-out', error_file_id=None)
+            mock_client.files.content.return_value = Mock(text=output)
+            
+            results = gai_interface.fetch_batch_results('batch_123', 'openai')
+            
+            self.assertEqual(results, {"a": "Reply A", "b": "Error occurred."})
+    
+    def test_poll_and_fetch_client_not_initialized(self):
+        """Test that polling and fetching report failure when the client is not initialized."""
+        with patch.object(gai_interface, 'OpenAIClient', None):
+            self.assertEqual(gai_interface.poll_batch('batch_123', 'openai'), (False, None))
+            self.assertEqual(gai_interface.fetch_batch_results('batch_123', 'openai'), {})
+    
+    def test_poll_and_fetch_api_error(self):
+        """Test that API errors while polling or fetching are handled."""
+        with patch.object(gai_interface, 'AnthropicClient') as mock_client:
+            mock_client.messages.batches.retrieve.side_effect = Exception("Batch not found")
+            mock_client.messages.batches.results.side_effect = Exception("Batch not found")
+            
+            self.assertEqual(gai_interface.poll_batch('msgbatch_bad', 'claude'), (False, None))
+            self.assertEqual(gai_interface.fetch_batch_results('msgbatch_bad', 'claude'), {})
+    
+    def test_fetch_failed_openai_batch(self):
+        """Test that a failed OpenAI batch gives no replies without reading any files."""
+        with patch.object(gai_interface, 'OpenAIClient') as mock_client:
+            mock_client.batches.retrieve.return_value = Mock(status='failed', output_file_id=None, error_file_id=None)
+            
+            self.assertEqual(gai_interface.fetch_batch_results('batch_123', 'openai'), {})
+            mock_client.files.content.assert_not_called()
+
+
+class TestGetAiRepliesPacked(unittest.TestCase):
+    """Tests for get_ai_replies_packed."""
+    
+    def test_turns_packed_into_chunks(self):
+        """Test that turns are split into requests of at most max_prompts_per_request."""
+        def mock_create(**kwargs):
+            turns = json.loads(kwargs['messages'][-1]['content'])
+            mock_response = Mock()
+            mock_response.choices = [Mock()]
+            mock_response.choices[0].message.content = json.dumps([f"Reply to {t}" for t in turns])
+            return mock_response
+        
+        with patch.object(gai_interface, 'OpenAIClient') as mock_client:
+            mock_client.chat.completions.create.side_effect = mock_create
+            
+            replies = gai_interface.get_ai_replies_packed(
+                "You are a helpful assistant.", ["a", "b", "c"], 'openai', 'gpt-4',
+                history=[{"role": "assistant", "content": "Hi!"}],
+                max_prompts_per_request=2)
+            
+            self.assertEqual(replies, ["Reply to a", "Reply to b", "Reply to c"])
+            self.assertEqual(mock_client.chat.completions.create.call_count, 2)
+            passed_messages = mock_client.chat.completions.create.call_args_list[0][1]['messages']
+            self.assertIn("JSON array of 2", passed_messages[0]['content'])
+            self.assertEqual(passed_messages[1], {"role": "assistant", "content": "Hi!"})
+    
+    def test_unparseable_reply_falls_back_to_single_requests(self):
+        """Test that turns are sent one at a time if the packed reply is not a JSON array."""
+        replies_to_send = iter(["Not JSON", "Reply to a", "Reply to b"])
+        def mock_create(**kwargs):
+            mock_response = Mock()
+            mock_response.choices = [Mock()]
+            mock_response.choices[0].message.content = next(replies_to_send)
+            return mock_response
+        
+        with patch.object(gai_interface, 'OpenAIClient') as mock_client:
+            mock_client.chat.completions.create.side_effect = mock_create
+            
+            replies = gai_interface.get_ai_replies_packed(
+                "You are a helpful assistant.", ["a", "b"], 'openai', 'gpt-4')
+            
+            self.assertEqual(replies, ["Reply to a", "Reply to b"])
+            self.assertEqual(mock_client.chat.completions.create.call_count, 3)
+    
+    def test_failed_request_not_resent(self):
+        """Test that a failed packed request gives each turn the error reply without resending."""
+        with patch.object(gai_interface, 'OpenAIClient') as mock_client:
+            mock_client.chat.completions.create.side_effect = Exception("Rate limit exceeded")
+            
+            replies = gai_interface.get_ai_replies_packed(
+                "You are a helpful assistant.", ["a", "b"], 'openai', 'gpt-4')
+            
+            error_reply = "I encountered an error and can't figure out how to respond to your message. Could you try again?"
+            self.assertEqual(replies, [error_reply, error_reply])
+            self.assertEqual(mock_client.chat.completions.create.call_count, 1)
+    
+    def test_claude_reply_limit_scaled_by_turns(self):
+        """Test that a packed Claude request allows max_reply_tokens for each turn."""
+        with patch.object(gai_interface, 'AnthropicClient') as mock_client:
+            mock_response = Mock()
+            mock_response.content = [Mock()]
+            mock_response.content[0].text = json.dumps(["Reply to a", "Reply to b", "Reply to c"])
+            mock_client.messages.create.return_value = mock_response
+            
+            replies = gai_interface.get_ai_replies_packed(
+                "You are a helpful assistant.", ["a", "b", "c"], 'claude', 'claude-sonnet-4-5',
+                max_reply_tokens=500)
+            
+            self.assertEqual(replies, ["Reply to a", "Reply to b", "Reply to c"])
+            self.assertEqual(mock_client.messages.create.call_args[1]['max_tokens'], 1500)
+    
+    def test_code_fence_unwrapped(self):
+        """Test that a packed reply wrapped in a json code fence is parsed."""
+        with patch.object(gai_interface, 'OpenAIClient') as mock_client:
+            mock_response = Mock()
+            mock_response.choices = [Mock()]
+            mock_response.choices[0].message.content = '```json\n["Reply to a", "Reply to b"]\n```'
+            mock_client.chat.completions.create.return_value = mock_response
+            
+            replies = gai_interface.get_ai_replies_packed(
+                "You are a helpful assistant.", ["a", "b"], 'openai', 'gpt-4')
+            
+            self.assertEqual(replies, ["Reply to a", "Reply to b"])
+            self.assertEqual(mock_client.chat.completions.create.call_count, 1)
+
+
+class TestResponseCache(unittest.TestCase):
+    """Tests for the GAI_CACHE response cache."""
+    
+    def setUp(self):
+        self.messages = [{"role": "user", "content": "Hello"}]
+        self.bot_instructions = "You are a helpful assistant."
+        cache_patch = patch.object(gai_interface, '_response_cache', OrderedDict())
+        cache_patch.start()
+        self.addCleanup(cache_patch.stop)
+    
+    def _mock_openai(self, mock_client, content="Hi!"):
+        mock_response = Mock()
+        mock_response.choices = [Mock()]
+        mock_response.choices[0].message.content = content
+        mock_client.chat.completions.create.return_value = mock_response
+    
+    def test_cache_disabled_by_default(self):
+        """Test that identical requests are sent again when GAI_CACHE is not set."""
+        with patch.dict(os.environ, {}, clear=False), \
+                patch.object(gai_interface, 'OpenAIClient') as mock_client:
+            os.environ.pop('GAI_CACHE', None)
+            self._mock_openai(mock_client)
+            
+            gai_interface.get_ai_reply(self.messages, self.bot_instructions, 'openai', 'gpt-4')
+            gai_interface.get_ai_reply(self.messages, self.bot_instructions, 'openai', 'gpt-4')
+            
+            self.assertEqual(mock_client.chat.completions.create.call_count, 2)
+    
+    def test_cache_hit(self):
+        """Test that identical requests are answered from the cache when GAI_CACHE=1."""
+        with patch.dict(os.environ, {'GAI_CACHE': '1'}), \
+                patch.object(gai_interface, 'OpenAIClient') as mock_client:
+            os.environ.pop('GAI_CACHE_FILE', None)
+            self._mock_openai(mock_client)
+            
+            first = gai_interface.get_ai_reply(self.messages, self.bot_instructions, 'openai', 'gpt-4')
+            second = gai_interface.get_ai_reply(self.messages, self.bot_instructions, 'openai', 'gpt-4')
+            other_model = gai_interface.get_ai_reply(self.messages, self.bot_instructions, 'openai', 'gpt-3.5-turbo')
+            streamed = list(gai_interface.stream_ai_reply(
+                self.messages, self.bot_instructions, 'openai', 'gpt-4'))
+            
+            self.assertEqual((first, second, other_model), ("Hi!", "Hi!", "Hi!"))
+            self.assertEqual(streamed, ["Hi!"])
+            self.assertEqual(mock_client.chat.completions.create.call_count, 2)
+    
+    def test_errors_not_cached(self):
+        """Test that error replies are not cached."""
+        with patch.dict(os.environ, {'GAI_CACHE': '1'}), \
+                patch.object(gai_interface, 'OpenAIClient') as mock_client:
+            os.environ.pop('GAI_CACHE_FILE', None)
+            mock_client.chat.completions.create.side_effect = Exception("Network error")
+            gai_interface.get_ai_reply(self.messages, self.bot_instructions, 'openai', 'gpt-4')
+            
+            mock_client.chat.completions.create.side_effect = None
+            self._mock_openai(mock_client)
+            result = gai_interface.get_ai_reply(self.messages, self.bot_instructions, 'openai', 'gpt-4')
+            
+            self.assertEqual(result, "Hi!")
+            self.assertEqual(mock_client.chat.completions.create.call_count, 2)
+    
+    def test_cache_file_persists_replies(self):
+        """Test that replies are read back from GAI_CACHE_FILE after the memory cache is cleared."""
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cache_file = os.path.join(cache_dir, 'gai_cache')
+            with patch.dict(os.environ, {'GAI_CACHE': '1', 'GAI_CACHE_FILE': cache_file}), \
+                    patch.object(gai_interface, 'OpenAIClient') as mock_client:
+                self._mock_openai(mock_client)
+                gai_interface.get_ai_reply(self.messages, self.bot_instructions, 'openai', 'gpt-4')
+                
+                gai_interface._response_cache.clear()
+                result = gai_interface.get_ai_reply(self.messages, self.bot_instructions, 'openai', 'gpt-4')
+                
+                self.assertEqual(result, "Hi!")
+                mock_client.chat.completions.create.assert_called_once()
 
 
 class TestGetAiReplyUnknownPlatform(unittest.TestCase):
@@ -13,12 +13,27 @@ Usage:
 import argparse
 import yaml
 import json
+import functools
 import logging
 import random
+import re
+import string
 from datetime import datetime
 import sys
 import os
 
+# Importing readline gives input() line editing and history, where available
+try:
+    import readline  # noqa: F401
+except ImportError:
+    pass
+
+# Use the faster C YAML loader when libyaml is available
+try:
+    from yaml import CSafeLoader as YamlLoader
+except ImportError:
+    from yaml import SafeLoader as YamlLoader
+
 # Add lib directory to path to import gai_interface
 sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '../../'))
 sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '../../lib'))
@@ -28,18 +43,49 @@ import gai_interface
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
 
+# Separator lines used in conversation output
+SEP_EQ = "=" * 80
+SEP_DASH = "-" * 80
+BANNER = f"\n{SEP_EQ}\n"
+
+# Generic values for template placeholders
+PROMPT_TEST_VALUES = {
+    'user': "[test_user]",
+    'subreddit_rules': "[test subreddit rules]"
+}
+FIRST_MESSAGE_TEST_VALUES = {
+    'subreddit': "[test_subreddit]",
+    'comment': "[test comment]"
+}
+
+# Batch request IDs the Batch APIs accept (Anthropic rejects the whole batch otherwise)
+CUSTOM_ID_RE = re.compile(r'[a-zA-Z0-9_-]{1,64}')
+
+
+@functools.lru_cache(maxsize=8)
+def _load_yaml(config_file, mtime_ns):
+    """Parse a YAML file. Cached on the file's modification time, so edits are picked up."""
+    with open(config_file, 'r') as f:
+        return yaml.load(f, Loader=YamlLoader)
+
 
 def load_config(config_file):
-    """Load configuration from YAML file."""
+    """Load configuration from YAML file. The returned dict is cached, so do not modify it."""
     try:
-        with open(config_file, 'r') as f:
-            return yaml.safe_load(f)
+        config = _load_yaml(config_file, os.stat(config_file).st_mtime_ns)
     except FileNotFoundError:
         logging.error(f"Config file not found: {config_file}")
         exit(1)
     except yaml.YAMLError as e:
         logging.error(f"Error parsing config file: {e}")
         exit(1)
+    
+    # Check the placeholders in each template once, up front
+    for section, test_values in (('gai_prompt', PROMPT_TEST_VALUES),
+                                 ('first_consented_message', FIRST_MESSAGE_TEST_VALUES)):
+        for key, template in (config.get(section) or {}).items():
+            fill_placeholders(template, test_values, f"{section} '{key}'")
+    return config
 
 
 def select_from_list(items, prompt_text):
@@ -51,25 +97,28 @@ def select_from_list(items, prompt_text):
         prompt_text: Text to display as the prompt
         
     Returns:
-        Selected item
+        Tuple of (index, item) for the selected item
     """
-    print(f"\n{prompt_text}")
-    for i, item in enumerate(items, 1):
-        print(f"  {i}. {item}")
+    # Write the whole menu at once; long lists are slow to print line by line over SSH
+    menu = [f"\n{prompt_text}\n"]
+    menu.extend(f"  {i}. {item}\n" for i, item in enumerate(items, 1))
+    sys.stdout.write(''.join(menu))
+    sys.stdout.flush()
     
     while True:
         try:
             choice = input(f"\nEnter your choice (1-{len(items)}): ").strip()
-            choice_num = int(choice)
-            if 1 <= choice_num <= len(items):
-                return items[choice_num - 1]
-            else:
-                print(f"Please enter a number between 1 and {len(items)}")
-        except ValueError:
-            print("Please enter a valid number")
         except KeyboardInterrupt:
             print("\n\nExiting...")
             exit(0)
+        
+        if not choice.isdecimal():
+            print("Please enter a valid number")
+            continue
+        choice_num = int(choice)
+        if 1 <= choice_num <= len(items):
+            return choice_num - 1, items[choice_num - 1]
+        print(f"Please enter a number between 1 and {len(items)}")
 
 
 def select_gai_model(config):
@@ -82,10 +131,7 @@ def select_gai_model(config):
     
     # Format models for display
     model_displays = [f"{platform}: {model}" for platform, model in all_models]
-    selected_display = select_from_list(model_displays, "Select a GAI model:")
-    
-    # Find the corresponding platform and model
-    selected_index = model_displays.index(selected_display)
+    selected_index, _ = select_from_list(model_displays, "Select a GAI model:")
     return all_models[selected_index]
 
 
@@ -96,7 +142,7 @@ def select_bot_prompt(config):
         exit(1)
     
     prompts = list(config['gai_prompt'].keys())
-    selected_key = select_from_list(prompts, "Select a bot prompt:")
+    _, selected_key = select_from_list(prompts, "Select a bot prompt:")
     return selected_key, config['gai_prompt'][selected_key]
 
 
@@ -107,7 +153,7 @@ def select_first_consented_message(config):
         exit(1)
     
     messages = list(config['first_consented_message'].keys())
-    selected_key = select_from_list(messages, "Select a first consented message:")
+    _, selected_key = select_from_list(messages, "Select a first consented message:")
     return selected_key, config['first_consented_message'][selected_key]
 
 
@@ -149,34 +195,237 @@ def random_first_consented_message(config):
 
 
 
+@functools.lru_cache(maxsize=None)
+def get_placeholder_fields(template):
+    """
+    Get the names of the placeholder fields in a template string.
+    
+    Args:
+        template: Template string using str.format() syntax
+        
+    Returns:
+        Frozenset of field names (empty if the template has no fields)
+    
+    Raises:
+        ValueError: If the template is not a valid format string
+    """
+    return frozenset(
+        re.split(r'[.\[]', name, maxsplit=1)[0]
+        for _, name, _, _ in string.Formatter().parse(template) if name is not None)
+
+
+def fill_placeholders(template, test_values, config_key):
+    """
+    Replace the placeholders in a template with generic test values.
+    
+    Exits with an error if the template cannot be parsed or filled, or uses a field
+    without a test value, since the chatbot would fail on the same template.
+    
+    Args:
+        template: Template string using str.format() syntax
+        test_values: Dictionary of test values for the fields the template may use
+        config_key: Config section and key of the template, for error messages
+        
+    Returns:
+        Formatted string
+    """
+    try:
+        fields = get_placeholder_fields(template)
+        unknown = fields.difference(test_values)
+        if unknown:
+            names = ', '.join(f"{{{field}}}" for field in sorted(unknown))
+            logging.error(f"Unknown placeholders in {config_key}: {names}")
+            exit(1)
+        return template.format(**{field: test_values[field] for field in fields})
+    except (AttributeError, IndexError, KeyError, ValueError) as e:
+        logging.error(f"Could not fill placeholders in {config_key}: {e}")
+        exit(1)
+
+
+def format_bot_prompt(bot_prompt, prompt_key):
+    """Replace placeholders in a bot prompt with generic test values."""
+    return fill_placeholders(bot_prompt, PROMPT_TEST_VALUES, f"gai_prompt '{prompt_key}'")
+
+
+def format_first_message(first_message, first_message_key):
+    """Replace placeholders in a first consented message with generic test values."""
+    return fill_placeholders(first_message, FIRST_MESSAGE_TEST_VALUES,
+                             f"first_consented_message '{first_message_key}'")
+
+
+def load_test_messages(messages_file, config):
+    """Load test user messages (one per line) and check the config has prompts to test."""
+    try:
+        with open(messages_file, 'r') as f:
+            user_messages = [line.strip() for line in f if line.strip()]
+    except FileNotFoundError:
+        logging.error(f"Messages file not found: {messages_file}")
+        exit(1)
+    
+    if not config.get('gai_prompt') or not config.get('first_consented_message'):
+        logging.error("Batch mode needs bot prompts and first consented messages in the config file")
+        exit(1)
+    
+    return user_messages
+
+
+def run_packed_test(gai_platform, gai_model, messages_file, config, output_file):
+    """
+    Get replies for every prompt and first message, paired with each test user message,
+    packing several test messages into each request.
+    
+    Args:
+        gai_platform: Platform to use (e.g., 'openai', 'claude')
+        gai_model: Model name
+        messages_file: Path to a text file with one test user message per line
+        config: Configuration dictionary
+        output_file: Path to save the replies
+    """
+    user_messages = load_test_messages(messages_file, config)
+    
+    results = {}
+    for prompt_key, bot_prompt in config['gai_prompt'].items():
+        bot_prompt = format_bot_prompt(bot_prompt, prompt_key)
+        for first_message_key, first_message in config['first_consented_message'].items():
+            print(f"Getting replies for {prompt_key} / {first_message_key}...")
+            replies = gai_interface.get_ai_replies_packed(
+                bot_prompt, user_messages, gai_platform, gai_model,
+                history=[{"role": "assistant",
+                          "content": format_first_message(first_message, first_message_key)}],
+                max_prompts_per_request=config.get('max_prompts_per_request',
+                                                   gai_interface.DEFAULT_MAX_PROMPTS_PER_REQUEST),
+                max_tokens=config.get('max_tokens', gai_interface.DEFAULT_MAX_TOKENS),
+                max_reply_tokens=config.get('max_reply_tokens'))
+            for i, reply in enumerate(replies, 1):
+                results[f"{prompt_key}--{first_message_key}--{i}"] = reply
+    
+    save_batch_replies(output_file, f"Packed replies from {gai_platform}: {gai_model}", results)
+    print(f"\nSaved {len(results)} replies to {output_file}")
+
+
+def submit_test_batch(gai_platform, gai_model, messages_file, config):
+    """
+    Submit every prompt and first message, paired with each test user message, as one batch.
+    
+    Args:
+        gai_platform: Platform to use (e.g., 'openai', 'claude')
+        gai_model: Model name
+        messages_file: Path to a text file with one test user message per line
+        config: Configuration dictionary
+    """
+    user_messages = load_test_messages(messages_file, config)
+    
+    requests = []
+    for prompt_key, bot_prompt in config['gai_prompt'].items():
+        bot_prompt = format_bot_prompt(bot_prompt, prompt_key)
+        for first_message_key, first_message in config['first_consented_message'].items():
+            first_message = format_first_message(first_message, first_message_key)
+            for i, user_message in enumerate(user_messages, 1):
+                custom_id = f"{prompt_key}--{first_message_key}--{i}"
+                if not CUSTOM_ID_RE.fullmatch(custom_id):
+                    logging.error(f"Batch request ID {custom_id!r} must be 1-64 letters, digits, '_' or '-'. "
+                                  f"Rename gai_prompt '{prompt_key}' or first_consented_message "
+                                  f"'{first_message_key}' in the config file.")
+                    exit(1)
+                requests.append({
+                    'custom_id': custom_id,
+                    'bot_instructions': bot_prompt,
+                    'messages': [
+                        {"role": "assistant", "content": first_message},
+                        {"role": "user", "content": user_message}
+                    ]
+                })
+    
+    batch_id = gai_interface.submit_batch(
+        requests, gai_platform, gai_model,
+        max_tokens=config.get('max_tokens', gai_interface.DEFAULT_MAX_TOKENS),
+        max_reply_tokens=config.get('max_reply_tokens'))
+    if batch_id is None:
+        logging.error("Batch submission failed")
+        exit(1)
+    
+    print(f"\nSubmitted {len(requests)} requests as batch {batch_id}")
+    print(f"Fetch the replies later with: --batch-results {batch_id} --platform {gai_platform}")
+
+
+def fetch_test_batch(batch_id, gai_platform, output_file):
+    """
+    Fetch the replies for a submitted batch and save them if the batch has finished.
+    
+    Args:
+        batch_id: ID of the submitted batch
+        gai_platform: Platform the batch was submitted to
+        output_file: Path to save the replies
+    """
+    finished, status = gai_interface.poll_batch(batch_id, gai_platform)
+    if status is None:
+        print(f"\nCould not get the status of batch {batch_id}")
+        return
+    if not finished:
+        print(f"\nBatch {batch_id} has not finished yet (status: {status})")
+        return
+    
+    results = gai_interface.fetch_batch_results(batch_id, gai_platform)
+    if not results:
+        print(f"\nNo replies to save for batch {batch_id} (status: {status})")
+        return
+    save_batch_replies(output_file, f"Batch {batch_id} from {gai_platform}", results)
+    print(f"\nSaved {len(results)} batch replies to {output_file} (status: {status})")
+
+
+def save_batch_replies(output_file, title, results):
+    """
+    Save replies from a batch or packed run to the output file.
+    
+    Args:
+        output_file: Path to output file
+        title: Heading describing where the replies came from
+        results: Dictionary mapping request IDs to replies
+    """
+    parts = [
+        BANNER,
+        f"{title} at {datetime.now().isoformat()}\n",
+        f"{SEP_EQ}\n\n",
+    ]
+    for custom_id in sorted(results):
+        parts.append(f"{custom_id}: {results[custom_id]}\n{SEP_DASH}\n")
+    
+    try:
+        with open(output_file, 'a') as f:
+            f.write(''.join(parts))
+        logging.info(f"Replies saved to {output_file}")
+    except Exception as e:
+        logging.error(f"Error saving replies: {e}")
+
+
 def save_conversation(output_file, conversation_data):
     """
     Save the conversation to the output file.
     
     Args:
         output_file: Path to output file
-        conversation_data: Dictionary with conversation metadata and messages
+        conversation_data: Dictionary with conversation metadata and messages (Msg objects)
     """
     try:
+        parts = [
+            BANNER,
+            f"Conversation at {conversation_data['timestamp']}\n",
+            f"GAI Platform: {conversation_data['gai_platform']}\n",
+            f"GAI Model: {conversation_data['gai_model']}\n",
+            f"Prompt Key: {conversation_data['prompt_key']}\n",
+            f"First Consented Message Key: {conversation_data['first_message_key']}\n",
+            f"{SEP_EQ}\n\n",
+            "System Prompt:\n",
+            f"{conversation_data['system_prompt']}\n\n",
+            "Conversation:\n",
+            f"{SEP_DASH}\n",
+        ]
+        for message in conversation_data['messages']:
+            parts.append(f"{message.role.upper()}: {message.content}\n{SEP_DASH}\n")
+        parts.append("\n")
+        
         with open(output_file, 'a') as f:
-            f.write("\n" + "="*80 + "\n")
-            f.write(f"Conversation at {conversation_data['timestamp']}\n")
-            f.write(f"GAI Platform: {conversation_data['gai_platform']}\n")
-            f.write(f"GAI Model: {conversation_data['gai_model']}\n")
-            f.write(f"Prompt Key: {conversation_data['prompt_key']}\n")
-            f.write(f"First Consented Message Key: {conversation_data['first_message_key']}\n")
-            f.write("="*80 + "\n\n")
-            
-            f.write("System Prompt:\n")
-            f.write(conversation_data['system_prompt'] + "\n\n")
-            
-            f.write("Conversation:\n")
-            f.write("-"*80 + "\n")
-            for message in conversation_data['messages']:
-                f.write(f"{message['role'].upper()}: {message['content']}\n")
-                f.write("-"*80 + "\n")
-            
-            f.write("\n")
+            f.write(''.join(parts))
         logging.info(f"Conversation saved to {output_file}")
     except Exception as e:
         logging.error(f"Error saving conversation: {e}")
@@ -197,16 +446,17 @@ def have_conversation(gai_platform, gai_model, bot_prompt, first_message,
         output_file: Path to save conversation
         config: Configuration dictionary
     """
-    print("\n" + "="*80)
+    print(f"\n{SEP_EQ}")
     print("Starting conversation. Type 'exit' or 'quit' to end the conversation.")
-    print("="*80 + "\n")
+    print(f"{SEP_EQ}\n")
     
     # Initialize conversation with first message from bot
     conversation_messages = []
     
     # Display first message
     print(f"BOT: {first_message}\n")
-    conversation_messages.append({"role": "assistant", "content": first_message})
+    conversation_messages.append(gai_interface.Msg("assistant", first_message))
+    running_tokens = conversation_messages[-1].tok
     
     # Get max tokens for the model (use config value or default)
     max_tokens = config.get('max_tokens', gai_interface.DEFAULT_MAX_TOKENS)
@@ -231,25 +481,40 @@ def have_conversation(gai_platform, gai_model, bot_prompt, first_message,
             break
         
         # Add user message to conversation
-        conversation_messages.append({"role": "user", "content": user_input})
+        conversation_messages.append(gai_interface.Msg("user", user_input))
+        running_tokens += conversation_messages[-1].tok
         interaction_count += 1
         
-        # Get AI response
-        print("\nThinking...\n")
-        reply = gai_interface.get_ai_reply(
-            messages=conversation_messages,
-            bot_instructions=bot_prompt,
-            gai_platform=gai_platform,
-            gai_model=gai_model,
-            max_tokens=max_tokens,
-            max_interactions=max_interactions,
-            goodbye_message=config.get('goodbye_message', 'Thank you for the conversation.'),
-            conversation_length=interaction_count
-        )
-        
-        # Display AI response
-        print(f"BOT: {reply}\n")
-        conversation_messages.append({"role": "assistant", "content": reply})
+        # Stream the AI response as it arrives
+        sys.stdout.write("\nBOT: ")
+        sys.stdout.flush()
+        reply_parts = []
+        try:
+            for text in gai_interface.stream_ai_reply(
+                messages=conversation_messages,
+                bot_instructions=bot_prompt,
+                gai_platform=gai_platform,
+                gai_model=gai_model,
+                max_tokens=max_tokens,
+                max_interactions=max_interactions,
+                goodbye_message=config.get('goodbye_message', 'Thank you for the conversation.'),
+                conversation_length=interaction_count,
+                precomputed_tokens=running_tokens,
+                max_reply_tokens=config.get('max_reply_tokens')
+            ):
+                sys.stdout.write(text)
+                sys.stdout.flush()
+                reply_parts.append(text)
+        except Exception:
+            # Drop the partial reply and the user message so neither is saved or sent again
+            print("\n\nThe reply was interrupted. Please send your message again.\n")
+            running_tokens -= conversation_messages.pop().tok
+            interaction_count -= 1
+            continue
+        reply = ''.join(reply_parts)
+        print("\n")
+        conversation_messages.append(gai_interface.Msg("assistant", reply))
+        running_tokens += conversation_messages[-1].tok
         
         # Check if this was the goodbye message
         if interaction_count >= max_interactions:
@@ -305,15 +570,44 @@ def main():
         action='store_true',
         help='Enable interactive selection of model, prompt, and message (default: random selection)'
     )
+    parser.add_argument(
+        '--batch',
+        metavar='MESSAGES_FILE',
+        help='Submit every prompt and first message, paired with each test user message in '
+             'MESSAGES_FILE (one per line), to the Batch API instead of chatting'
+    )
+    parser.add_argument(
+        '--packed',
+        action='store_true',
+        help='With --batch, get replies now by packing several test messages into each '
+             'request instead of using the Batch API'
+    )
+    parser.add_argument(
+        '--batch-results',
+        metavar='BATCH_ID',
+        help='Fetch the replies for a previously submitted batch and save them to the output file'
+    )
+    parser.add_argument(
+        '--platform',
+        default='openai',
+        help='GAI platform the batch was submitted to. Only used with --batch-results; other '
+             'modes use the selected model\'s platform (default: openai)'
+    )
     
     args = parser.parse_args()
+    if args.packed and not args.batch:
+        parser.error('--packed requires --batch')
     
     # Set logging level
     logging.getLogger().setLevel(args.loglevel.upper())
     
-    print("\n" + "="*80)
+    print(f"\n{SEP_EQ}")
     print("Bot Prompt Testing Utility")
-    print("="*80)
+    print(SEP_EQ)
+    
+    if args.batch_results:
+        fetch_test_batch(args.batch_results, args.platform, args.output)
+        return
     
     # Load configuration
     config = load_config(args.config)
@@ -324,7 +618,21 @@ def main():
         # Step 1: Select GAI model
         gai_platform, gai_model = select_gai_model(config)
         print(f"\nSelected: {gai_platform} - {gai_model}")
-        
+    else:
+        print("\nRandom selection mode\n")
+        # Random selection
+        gai_platform, gai_model = random_gai_model(config)
+        print(f"GAI model: {gai_platform} - {gai_model}")
+    
+    # In batch mode, every prompt and first message is submitted for the selected model
+    if args.batch and args.packed:
+        run_packed_test(gai_platform, gai_model, args.batch, config, args.output)
+        return
+    if args.batch:
+        submit_test_batch(gai_platform, gai_model, args.batch, config)
+        return
+    
+    if args.interactive:
         # Step 2: Select bot prompt
         prompt_key, bot_prompt = select_bot_prompt(config)
         print(f"\nSelected prompt: {prompt_key}")
@@ -333,11 +641,6 @@ def main():
         first_message_key, first_message = select_first_consented_message(config)
         print(f"\nSelected first message: {first_message_key}")
     else:
-        print("\nRandom selection mode\n")
-        # Random selection
-        gai_platform, gai_model = random_gai_model(config)
-        print(f"GAI model: {gai_platform} - {gai_model}")
-        
         prompt_key, bot_prompt = random_bot_prompt(config)
         print(f"Bot prompt: {prompt_key}")
         
@@ -345,16 +648,8 @@ def main():
         print(f"First message: {first_message_key}")
     
     # Format the prompt and first message (replace placeholders with generic values)
-    # For testing purposes, we use placeholders
-    bot_prompt = bot_prompt.format(
-        user="[test_user]",
-        subreddit_rules="[test subreddit rules]"
-    ) if '{' in bot_prompt else bot_prompt
-    
-    first_message = first_message.format(
-        subreddit="[test_subreddit]",
-        comment="[test comment]"
-    ) if '{' in first_message else first_message
+    bot_prompt = format_bot_prompt(bot_prompt, prompt_key)
+    first_message = format_first_message(first_message, first_message_key)
     
     # Step 4: Have the conversation
     have_conversation(